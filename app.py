@@ -1,3 +1,5 @@
+from datetime import date
+
 import streamlit as st
 import ee
 import folium
@@ -13,11 +15,7 @@ def mask_S2_clouds(image):
     qa = image.select("QA60")
     cloudBitMask = 1 << 10
     cirrusBitMask = 1 << 11
-    opticalBands = image.select(["B1", "B2", "B3"])
-
-    mask_gt = (
-        opticalBands.select(["B1", "B2", "B3"]).reduce(ee.Reducer.min()).gt(0)
-    )
+    mask_gt = image.select(["B1", "B2", "B3"]).reduce(ee.Reducer.min()).gt(0)
     mask = (
         qa.bitwiseAnd(cloudBitMask)
         .eq(0)
@@ -29,7 +27,10 @@ def mask_S2_clouds(image):
 @st.cache_resource
 def initialize_gee():
     try:
-        ee.Initialize()
+        ee.Initialize(
+            project="ee-airgit1",
+            opt_url="https://earthengine-highvolume.googleapis.com",
+        )
         return True
     except Exception as e:
         st.error(
@@ -38,13 +39,20 @@ def initialize_gee():
         return False
 
 
+BAIKAL_SHAPE_ASSET = "projects/ee-airgit1/assets/baikal_shape"
+
+
+@st.cache_data(ttl=24 * 3600)
+def get_baikal_geojson(asset_id=BAIKAL_SHAPE_ASSET):
+    """Загружает границу озера Байкал в формате GeoJSON (один раз в сутки)."""
+    return ee.FeatureCollection(asset_id).geometry().getInfo()
+
+
 if not initialize_gee():
     st.stop()
 
 try:
-    baikal_geometry = ee.FeatureCollection(
-        "projects/ee-airgit1/assets/baikal_shape"
-    )
+    baikal_geometry = ee.FeatureCollection(BAIKAL_SHAPE_ASSET)
 except Exception as e:
     st.error("Ошибка загрузки геометрии озера Байкал")
     st.stop()
@@ -57,18 +65,29 @@ left_col, right_col = st.columns([1, 4])
 with left_col:
     st.subheader("Введите даты")
 
-    start_date = st.date_input(
-        "Начальная дата",
-        value=st.session_state.get("start_date", "2020-07-20"),
-        key="start_date_input",
-    )
-    end_date = st.date_input(
-        "Конечная дата",
-        value=st.session_state.get("end_date", "2020-07-30"),
-        key="end_date_input",
-    )
+    # Форма откладывает перезапуск скрипта до нажатия "Применить"
+    with st.form("dates"):
+        start_date = st.date_input(
+            "Начальная дата",
+            value=st.session_state.get("start_date", "2020-07-20"),
+            key="start_date_input",
+        )
+        end_date = st.date_input(
+            "Конечная дата",
+            value=st.session_state.get("end_date", "2020-07-30"),
+            key="end_date_input",
+        )
 
-    run_analysis = st.button("Применить", use_container_width=True)
+        quick_preview = st.checkbox(
+            "Быстрый просмотр",
+            value=False,
+            help="Мозаика последних снимков вместо медианного композита: "
+            "карта отображается быстрее, но менее устойчива к облачности",
+        )
+
+        run_analysis = st.form_submit_button(
+            "Применить", use_container_width=True
+        )
 
     if "map_data" in st.session_state:
         st.divider()
@@ -83,45 +102,161 @@ def calculate_oc3(image):
     b2 = image.select("B2")
     b3 = image.select("B3")
 
-    max_b1b2 = b1.max(b2)
-    ratio = max_b1b2.divide(b3)
-    R = ratio.log10()
-
-    a0 = 0.2389
-    a1 = -1.9369
-    a2 = 1.7627
-    a3 = -3.0777
-    a4 = -0.1054
-    oc3_log = ee.Image.constant(a0).add(
-        R.multiply(a1)
-        .add(R.pow(2).multiply(a2))
-        .add(R.pow(3).multiply(a3))
-        .add(R.pow(4).multiply(a4))
+    R = b1.max(b2).divide(b3).log10()
+
+    # Полином 4-й степени по схеме Горнера одним выражением:
+    # GEE вычисляет его как один узел графа вместо цепочки операций
+    oc3 = image.expression(
+        "pow(10, (((a4 * R + a3) * R + a2) * R + a1) * R + a0)",
+        {
+            "R": R,
+            "a0": 0.2389,
+            "a1": -1.9369,
+            "a2": 1.7627,
+            "a3": -3.0777,
+            "a4": -0.1054,
+        },
+    )
+
+    return oc3.rename("oc3").clip(baikal_geometry)
+
+
+OC3_CACHE_FOLDER = "projects/ee-airgit1/assets/oc3_cache"
+
+
+def find_oc3_asset(start, end):
+    """Возвращает ID ассета с экспортированным композитом OC3 за период
+    или None, если ассет ещё не создан."""
+    asset_id = f"{OC3_CACHE_FOLDER}/oc3_{start}_{end}"
+    try:
+        ee.data.getAsset(asset_id)
+    except ee.EEException:
+        return None
+    return asset_id
+
+
+@st.cache_resource(ttl=3600)
+def get_oc3_export_tasks():
+    """Возвращает общий для всех сессий словарь запущенных задач экспорта
+    ассетов OC3: (start, end) -> ee.batch.Task.
+
+    Словарь сбрасывается раз в час, поэтому период с неудачным экспортом
+    (например, без пригодных снимков) экспортируется повторно не чаще
+    одного раза в час.
+    """
+    return {}
+
+
+def export_oc3_asset(image, start, end):
+    """Запускает экспорт композита OC3 в ассет GEE, чтобы последующие
+    запросы тайлов не пересчитывали весь конвейер обработки.
+
+    Ассеты в OC3_CACHE_FOLDER автоматически не удаляются: устаревшие
+    ассеты нужно удалять вручную.
+    """
+    try:
+        ee.data.createAsset({"type": "FOLDER"}, OC3_CACHE_FOLDER)
+    except ee.EEException:
+        pass
+
+    task = ee.batch.Export.image.toAsset(
+        image=image,
+        description=f"oc3_{start}_{end}",
+        assetId=f"{OC3_CACHE_FOLDER}/oc3_{start}_{end}",
+        region=baikal_geometry.geometry(),
+        scale=60,
+        maxPixels=1e10,
+    )
+    task.start()
+    return task
+
+
+def resolve_oc3_asset(start, end):
+    """Возвращает ID ассета с композитом OC3 за период, если он уже
+    экспортирован.
+
+    Иначе запускает экспорт (если он ещё не запускался за последний час)
+    и возвращает None: до завершения экспорта тайлы строятся
+    по динамически вычисляемому изображению. Периоды, не закончившиеся
+    до сегодняшнего дня, не экспортируются: снимки за них ещё поступают
+    в коллекцию.
+    """
+    if date.fromisoformat(end) >= date.today():
+        return None
+
+    asset_id = find_oc3_asset(start, end)
+    if asset_id is not None:
+        return asset_id
+
+    export_tasks = get_oc3_export_tasks()
+    task = export_tasks.get((start, end))
+    if task is None:
+        export_tasks[(start, end)] = export_oc3_asset(
+            build_oc3_composite(start, end, quick_preview=False), start, end
+        )
+    elif task.status()["state"] == "FAILED":
+        st.warning(
+            "Не удалось сохранить композит за выбранный период, "
+            "карта строится без кэширования"
+        )
+    return None
+
+
+OC3_VIS_PARAMS = {
+    "min": 0,
+    "max": 5,
+    "palette": ["#d6f9cb", "#0E4205"],
+    "bands": "oc3",
+}
+
+
+def build_oc3_composite(start, end, quick_preview):
+    """Строит композит OC3 за период по коллекции Sentinel-2."""
+    sentinel_collection = (
+        ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
+        .filterDate(start, end)
+        .filterBounds(baikal_geometry)
+        .select(["B1", "B2", "B3", "QA60"])
+        .map(mask_S2_clouds)
+        .map(scale_msi)
+        .select(["B1", "B2", "B3"])
+        .map(calculate_oc3)
+        .select(["oc3"])
     )
 
-    oc3 = ee.Image(10).pow(oc3_log)
+    # Медиана устойчивее к остаточной облачности, чем среднее;
+    # мозаика не требует обхода всех снимков при отрисовке тайла.
+    if quick_preview:
+        return sentinel_collection.mosaic()
+    return sentinel_collection.median()
 
-    return oc3.select(["constant"], ["oc3"]).clip(baikal_geometry)
+
+@st.cache_resource(ttl=3600)
+def build_oc3_tile_url(start, end, quick_preview, asset_id=None):
+    """Возвращает URL тайлов композита OC3 за период.
+
+    Если задан asset_id, тайлы строятся по экспортированному ассету.
+    Кэшируется строка URL, а не ee.Image, поэтому повторный запуск
+    с теми же датами и тем же источником не обращается к GEE.
+    """
+    if asset_id is not None:
+        oc3_image = ee.Image(asset_id)
+    else:
+        oc3_image = build_oc3_composite(start, end, quick_preview)
+
+    map_id = oc3_image.getMapId(OC3_VIS_PARAMS)
+    return map_id["tile_fetcher"].url_format
 
 
 if run_analysis or "map_data" not in st.session_state:
     with st.spinner("Загрузка и обработка данных..."):
         try:
-            sentinel_collection = (
-                ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
-                .filterDate(
-                    start_date.strftime("%Y-%m-%d"),
-                    end_date.strftime("%Y-%m-%d"),
-                )
-                .filterBounds(baikal_geometry)
-                .map(mask_S2_clouds)
-                .map(scale_msi)
-                .select(["B1", "B2", "B3"])
-                .map(calculate_oc3)
+            start = start_date.strftime("%Y-%m-%d")
+            end = end_date.strftime("%Y-%m-%d")
+            asset_id = None if quick_preview else resolve_oc3_asset(start, end)
+            st.session_state.map_data = build_oc3_tile_url(
+                start, end, quick_preview, asset_id
             )
-
-            oc3_median = sentinel_collection.mean()
-            st.session_state.map_data = oc3_median
             st.session_state.start_date = start_date
             st.session_state.end_date = end_date
             st.success("Данные успешно обработаны!")
@@ -131,12 +266,9 @@ if run_analysis or "map_data" not in st.session_state:
             st.stop()
 
 
-def add_ee_layer(map_obj, ee_image, vis_params, name):
-    """Добавляет слой из Google Earth Engine на карту Folium."""
+def add_ee_layer(map_obj, tile_url, name):
+    """Добавляет слой тайлов Google Earth Engine на карту Folium."""
     try:
-        map_id = ee.Image(ee_image).getMapId(vis_params)
-        tile_url = map_id["tile_fetcher"].url_format
-
         folium.raster_layers.TileLayer(
             tiles=tile_url,
             name=name,
@@ -148,58 +280,59 @@ def add_ee_layer(map_obj, ee_image, vis_params, name):
         st.error(f"Ошибка добавления слоя GEE: {e}")
 
 
-with right_col:
-    if "map_data" in st.session_state:
-        st.subheader("Визуализация данных")
-        viz_params = {
-            "min": 0,
-            "max": 5,
-            "palette": ["#d6f9cb", "#0E4205"],
-            "bands": "oc3",
-        }
-
-        m = folium.Map(
-            location=[53.5, 107],
-            zoom_start=5,
-            tiles=None,
-            width="150%",
-            height=700,
-            control_scale=True,
+@st.cache_resource(ttl=3600, max_entries=16)
+def build_map(tile_url, asset_id=BAIKAL_SHAPE_ASSET):
+    """Собирает карту Folium со слоем OC3, границей озера и легендой.
+
+    Карта кэшируется по URL тайлов и ID ассета геометрии, поэтому
+    перезапуски скрипта без новых данных не пересобирают её.
+    """
+    m = folium.Map(
+        location=[53.5, 107],
+        zoom_start=5,
+        tiles=None,
+        width="150%",
+        height=700,
+        control_scale=True,
+    )
+
+    add_ee_layer(m, tile_url, 'Хлорофилл "а"')
+
+    m.add_child(
+        folium.GeoJson(
+            data=get_baikal_geojson(asset_id),
+            name="Байкал",
+            style_function=lambda x: {
+                "color": "blue",
+                "fillOpacity": 0,
+                "weight": 3,
+            },
         )
+    )
 
-        try:
-            add_ee_layer(
-                m, st.session_state.map_data, viz_params, 'Хлорофилл "а"'
-            )
+    legend_html = """<div style="position: fixed; bottom: 50px; right: 50px; z-index:1000; 
+    background-color: white; padding: 10px; border: 2px solid grey; 
+    border-radius: 5px; font-family: Arial, sans-serif;">
+    <div style="position: relative; height: 200px; width: 30px; margin-bottom: 5px;">
+    <!-- Вертикальный градиент -->
+    <div style="background: linear-gradient(to bottom, #d6f9cb, #0E4205); 
+                width: 15px; height: 100%; border: 1px solid #ccc; margin: 0 auto;"></div>
+    <!-- Метки значений -->
+    <div style="position: absolute; top: 0; left: 0; font-size: 12px;">0</div>
+    <div style="position: absolute; bottom: 0; left: 0; font-size: 12px;">5</div>
+    </div>
+    </div>"""
+
+    m.get_root().html.add_child(folium.Element(legend_html))
+    return m
 
-            fc = baikal_geometry.geometry()
-            m.add_child(
-                folium.GeoJson(
-                    data=fc.getInfo(),
-                    name="Байкал",
-                    style_function=lambda x: {
-                        "color": "blue",
-                        "fillOpacity": 0,
-                        "weight": 3,
-                    },
-                )
-            )
 
-            legend_html = """<div style="position: fixed; bottom: 50px; right: 50px; z-index:1000; 
-            background-color: white; padding: 10px; border: 2px solid grey; 
-            border-radius: 5px; font-family: Arial, sans-serif;">
-            <div style="position: relative; height: 200px; width: 30px; margin-bottom: 5px;">
-            <!-- Вертикальный градиент -->
-            <div style="background: linear-gradient(to bottom, #d6f9cb, #0E4205); 
-                        width: 15px; height: 100%; border: 1px solid #ccc; margin: 0 auto;"></div>
-            <!-- Метки значений -->
-            <div style="position: absolute; top: 0; left: 0; font-size: 12px;">0</div>
-            <div style="position: absolute; bottom: 0; left: 0; font-size: 12px;">5</div>
-            </div>
-            </div>"""
-
-            m.get_root().html.add_child(folium.Element(legend_html))
+with right_col:
+    if "map_data" in st.session_state:
+        st.subheader("Визуализация данных")
 
+        try:
+            m = build_map(st.session_state.map_data)
             st_folium(m, width=1200, height=700, returned_objects=[])
 
         except Exception as e:
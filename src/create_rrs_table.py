@@ -1,3 +1,7 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import ee
 import pandas as pd
 
@@ -40,11 +44,8 @@ def mask_s2_clouds(image: ee.Image) -> ee.Image:
     cloudBitMask = 1 << 10
     cirrusBitMask = 1 << 11
     selected_bands = ["B2", "B3", "B4", "B5", "B6", "B7", "B8", "B8A"]
-    opticalBands = image.select(selected_bands)
 
-    mask_gt = (
-        opticalBands.select(selected_bands).reduce(ee.Reducer.min()).gt(0)
-    )
+    mask_gt = image.select(selected_bands).reduce(ee.Reducer.min()).gt(0)
     mask = (
         qa.bitwiseAnd(cloudBitMask)
         .eq(0)
@@ -53,18 +54,141 @@ def mask_s2_clouds(image: ee.Image) -> ee.Image:
     return image.updateMask(mask.And(mask_gt))
 
 
-def preproc(ic: ee.ImageCollection, df: pd.DataFrame) -> pd.DataFrame:
+def get_info_with_retry(
+    obj: ee.ComputedObject, retries: int = 5, delay: float = 1.0
+):
+    """Выполняет getInfo() для объекта GEE с повторными попытками
+    и экспоненциальной задержкой при превышении лимитов GEE (HTTP 429,
+    "Too Many Requests", "Too many concurrent aggregations", квоты),
+    которое возможно при параллельных вызовах. Остальные ошибки
+    ee.EEException пробрасываются сразу.
+
+    Args:
+        obj (ee.ComputedObject): Объект GEE, значение которого запрашивается
+        retries (int): Максимальное число попыток
+        delay (float): Начальная задержка между попытками в секундах
+
+    Returns:
+        Значение объекта, полученное с сервера GEE.
+    """
+
+    for attempt in range(retries):
+        try:
+            return obj.getInfo()
+        except ee.EEException as e:
+            # EEException содержит только текст ошибки сервера;
+            # код HTTP доступен у исходного HttpError
+            status = getattr(getattr(e.__context__, "resp", None), "status", 0)
+            message = str(e).lower()
+            throttled = (
+                int(status) == 429
+                or "too many" in message
+                or "quota" in message
+            )
+            if not throttled or attempt == retries - 1:
+                raise
+            time.sleep(delay * 2**attempt)
+
+
+RRS_BANDS = ["B2", "B3", "B4", "B5", "B6", "B7", "B8", "B8A"]
+
+
+def points_from_df(df: pd.DataFrame) -> ee.FeatureCollection:
+    """Собирает точки наблюдений из DataFrame в ee.FeatureCollection.
+
+    Args:
+        df (pd.DataFrame): DataFrame с колонками 'datetime', 'LATITUDE',
+            'LONGITUDE'
+
+    Returns:
+        ee.FeatureCollection: Точки со свойствами 'idx' (индекс строки df)
+        и 'datetime'.
+    """
+
+    idx = df.index.to_numpy().tolist()
+    dt_arr = df["datetime"].to_numpy().tolist()
+    lon_arr = df["LONGITUDE"].astype(float).to_numpy().tolist()
+    lat_arr = df["LATITUDE"].astype(float).to_numpy().tolist()
+
+    return ee.FeatureCollection(
+        [
+            ee.Feature(ee.Geometry.Point(lon, lat), {"idx": i, "datetime": dt})
+            for i, dt, lon, lat in zip(idx, dt_arr, lon_arr, lat_arr)
+        ]
+    )
+
+
+def sample_points(
+    ic: ee.ImageCollection, points: ee.FeatureCollection
+) -> ee.FeatureCollection:
+    """Дополняет каждую точку медианными значениями каналов RRS_BANDS
+    первого валидного снимка во временном окне ±1 день от даты наблюдения.
+    Вычисления выполняются на стороне сервера GEE.
+
+    Args:
+        ic (ee.ImageCollection): Исходная коллекция изображений Sentinel-2
+        points (ee.FeatureCollection): Точки, полученные points_from_df
+
+    Returns:
+        ee.FeatureCollection: Точки с добавленными значениями каналов;
+        у точек без валидных данных каналы отсутствуют.
+    """
+
+    ic_ready = (
+        ic.select(RRS_BANDS + ["QA60"]).map(scale_msi).map(mask_s2_clouds)
+    )
+
+    def sample(feature: ee.Feature) -> ee.Feature:
+        date_of_observation = ee.Date(feature.get("datetime"))
+        images = ic_ready.filterDate(
+            date_of_observation.advance(-1, "day"),
+            date_of_observation.advance(1, "day"),
+        ).filterBounds(feature.geometry())
+
+        def reduce_image(image: ee.Image) -> ee.Feature:
+            return ee.Feature(
+                None,
+                image.reduceRegion(
+                    reducer=ee.Reducer.median(),
+                    geometry=feature.geometry(),
+                    scale=20,
+                ),
+            )
+
+        first_valid = (
+            images.map(reduce_image).filter(ee.Filter.notNull(["B3"])).first()
+        )
+        return feature.set(
+            ee.Algorithms.If(
+                first_valid,
+                ee.Feature(first_valid).toDictionary(),
+                ee.Dictionary(),
+            )
+        )
+
+    return points.map(sample)
+
+
+def preproc(
+    ic: ee.ImageCollection,
+    df: pd.DataFrame,
+    chunk_size: int = 50,
+    max_workers: int = 32,
+) -> pd.DataFrame:
     """Извлекает значения коэффициента отражения для заданных точек и дат
     из коллекции изображений MSI/Sentinel-2 и сопоставляет измерения
     (концентрации хлорофилла-а).
 
-    Для каждой точки в DataFrame:
+    Точки разбиваются на пакеты по chunk_size, каждый пакет собирается
+    в ee.FeatureCollection, и для каждой точки на стороне сервера GEE:
     1. Создает временное окно ±1 день от указанной даты измерения
     2. Осуществляет поиск в ImageCollection по дате и координате измерения
-    3. Применяет масштабирование и маскирование облаков на найденном снимке
+    3. Применяет масштабирование и маскирование облаков на найденных снимках
     4. Извлекает медианные значения пикселя 20х20 квадратных метров
         для первого валидного изображения
-    5. Сопоставляет концентрацию хлорофилла-а
+    Результат каждого пакета загружается одним запросом getInfo(),
+    пакеты запрашиваются параллельно в max_workers потоках,
+    после чего сопоставляется концентрация хлорофилла-а.
 
     Args:
         ic (ee.ImageCollection): Исходная коллекция изображений Sentinel-2
@@ -74,6 +198,8 @@ def preproc(ic: ee.ImageCollection, df: pd.DataFrame) -> pd.DataFrame:
             - 'LATITUDE' (широта точки),
             - 'LONGITUDE' (долгота точки),
             - 'CHL' (концентарция хлорофилла-а в мкг/л)
+        chunk_size (int): Число точек в одном запросе к GEE
+        max_workers (int): Число одновременных запросов к GEE
 
     Returns:
         pd.DataFrame: DataFrame с извлеченными значениями каналов, где:
@@ -83,6 +209,7 @@ def preproc(ic: ee.ImageCollection, df: pd.DataFrame) -> pd.DataFrame:
                                                 'B6','B7','B8','B8A', 'CHL']
             - Значения представляют коэффициент отражения (диапазон (0;1))
             - Концентарция хлорофилла-а в мкг/л
+            - Все значения имеют тип float32
 
     Пример выходной таблицы:
         index | B2    | B3    | B4    | ...
@@ -96,60 +223,124 @@ def preproc(ic: ee.ImageCollection, df: pd.DataFrame) -> pd.DataFrame:
     из выходного DataFrame
     """
 
+    def sample_chunk(start: int) -> list:
+        points = points_from_df(df.iloc[start : start + chunk_size])
+        return get_info_with_retry(sample_points(ic, points))["features"]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        chunks = list(
+            executor.map(sample_chunk, range(0, len(df), chunk_size))
+        )
+
     dict_stats = {
-        key: value
-        for key, value in zip(df.index.to_list(), df["datetime"].to_list())
+        feature["properties"]["idx"]: feature["properties"]
+        for features in chunks
+        for feature in features
+        if feature["properties"].get("B3") is not None
     }
-    for i in dict_stats:
-        date_of_observation = ee.Date(df["datetime"][i])
-        start_date = date_of_observation.advance(-1, "day")
-        end_date = date_of_observation.advance(1, "day")
-
-        images = (
-            ic.filterDate(start_date, end_date)
-            .filterBounds(
-                ee.Geometry.Point(
-                    float(df["LONGITUDE"][i]), float(df["LATITUDE"][i])
-                )
-            )
-            .map(scale_msi)
-            .map(mask_s2_clouds)
-        )
-        found_stats = None
-        if images.size().getInfo():
-            img = images.toList(images.size())
-            for j in range(img.length().getInfo()):
-                v_mean = (
-                    ee.Image(img.get(j))
-                    .reduceRegion(
-                        reducer=ee.Reducer.median(),
-                        geometry=ee.Geometry.Point(
-                            float(df["LONGITUDE"][i]), float(df["LATITUDE"][i])
-                        ),
-                        scale=20,
-                    )
-                    .getInfo()
-                )
-                if v_mean["B3"] is not None:
-                    found_stats = v_mean
-                    break
-        dict_stats[i] = found_stats
-
-    for k, v in list(dict_stats.items()):
-        if not v:
-            del dict_stats[k]
     return (
         pd.DataFrame.from_dict(dict_stats, orient="index")
-        .loc[:, ["B2", "B3", "B4", "B5", "B6", "B7", "B8", "B8A"]]
-        .join(df_all["CHL"])
+        .loc[:, RRS_BANDS]
+        .join(df["CHL"])
+        .astype("float32")
+    )
+
+
+def export_preproc(
+    ic: ee.ImageCollection,
+    df: pd.DataFrame,
+    description: str = "rrs_export",
+    poll_interval: float = 30.0,
+) -> ee.batch.Task:
+    """Выгружает значения коэффициента отражения для точек наблюдений
+    в Google Drive в формате .csv через пакетный экспорт GEE.
+
+    В отличие от preproc, вычисления не ограничены лимитами интерактивного
+    API и распараллеливаются на стороне GEE. Функция ожидает завершения
+    задачи; полученный .csv сопоставляется с концентрацией хлорофилла-а
+    функцией join_exported.
+
+    Args:
+        ic (ee.ImageCollection): Исходная коллекция изображений Sentinel-2
+        df (pd.DataFrame): DataFrame с точками наблюдений (см. preproc)
+        description (str): Название задачи и имя файла в Google Drive
+        poll_interval (float): Интервал опроса статуса задачи в секундах
+
+    Returns:
+        ee.batch.Task: Завершённая задача экспорта.
+
+    Raises:
+        ee.EEException: Если задача экспорта завершилась с ошибкой.
+    """
+
+    task = ee.batch.Export.table.toDrive(
+        collection=sample_points(ic, points_from_df(df)),
+        description=description,
+        fileFormat="CSV",
+        selectors=["idx"] + RRS_BANDS,
+    )
+    task.start()
+    while task.active():
+        time.sleep(poll_interval)
+
+    status = task.status()
+    if status["state"] != "COMPLETED":
+        raise ee.EEException(
+            f"Экспорт {description} завершился со статусом "
+            f"{status['state']}: {status.get('error_message')}"
+        )
+    return task
+
+
+def join_exported(path: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Сопоставляет таблицу, выгруженную export_preproc, с концентрацией
+    хлорофилла-а.
+
+    Args:
+        path (str): Путь к загруженному из Google Drive файлу .csv
+        df (pd.DataFrame): DataFrame с точками наблюдений и колонкой 'CHL'
+
+    Returns:
+        pd.DataFrame: Таблица того же вида, что возвращает preproc.
+    """
+
+    return (
+        pd.read_csv(path, index_col="idx")
+        .dropna(subset=["B3"])
+        .loc[:, RRS_BANDS]
+        .join(df["CHL"])
+        .astype("float32")
     )
 
 
 if __name__ == "__main__":
-    df_all = pd.read_csv("../data/processed/chl_data.csv")
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--export",
+        action="store_true",
+        help="выгрузить таблицу в Google Drive через пакетный экспорт GEE",
+    )
+    args = parser.parse_args()
+
+    df_all = pd.read_csv(
+        "../data/processed/chl_data.csv",
+        usecols=["datetime", "LATITUDE", "LONGITUDE", "CHL"],
+        dtype={
+            "datetime": "str",
+            "LATITUDE": "float64",
+            "LONGITUDE": "float64",
+            "CHL": "float32",
+        },
+    )
 
     ee.Authenticate()
-    ee.Initialize(project="ee-airgit1")
+    ee.Initialize(
+        project="ee-airgit1",
+        opt_url="https://earthengine-highvolume.googleapis.com",
+    )
 
     ic_msi = ee.ImageCollection("COPERNICUS/S2_SR_HARMONIZED")
-    preproc(ic_msi, df_all).to_csv("../data/processed/rrs_data.csv")
+    if args.export:
+        export_preproc(ic_msi, df_all)
+    else:
+        preproc(ic_msi, df_all).to_csv("../data/processed/rrs_data.csv")
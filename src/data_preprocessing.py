@@ -1,15 +1,18 @@
-import copy
-from datetime import datetime, timedelta
-
+import numpy as np
 import pandas as pd
 
+# Присваивание колонки в неглубокой копии DataFrame копирует только эту
+# колонку; в pandas >= 3.0 Copy-on-Write включён всегда.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.options.mode.copy_on_write = True
+
 
 def convert_degree_and_min_to_degree(
     _data_frame: pd.DataFrame, name_of_col: str
 ) -> pd.DataFrame:
     """Преобразует значения в указанной колонке DataFrame из формата
     градусы-минуты (например, "45 30.5") в десятичные градусы (например,
-    "45.5083").
+    45.5083). Знак берётся из градусов, в том числе для "-0 30.5".
 
     Args:
         _data_frame (pd.DataFrame): исходный DataFrame с данными
@@ -19,15 +22,15 @@ def convert_degree_and_min_to_degree(
 
     Returns:
         pd.DataFrame: новый DataFrame с преобразованными значениями
-        в указанной колонке
+        типа float в указанной колонке
     """
 
-    data_frame = copy.copy(_data_frame)
-    data_list = data_frame[name_of_col].tolist()
-    for i, item in enumerate(data_list):
-        integer, frac = item.split(" ")
-        data_list[i] = integer + str(float(frac) / 60)[1:]
-    data_frame[name_of_col] = data_list
+    data_frame = _data_frame.copy(deep=False)
+    parts = data_frame[name_of_col].str.split(" ", n=1, expand=True)
+    sign = np.where(parts[0].str.startswith("-"), -1.0, 1.0)
+    degrees = parts[0].str.lstrip("-").astype(float)
+    minutes = parts[1].astype(float)
+    data_frame[name_of_col] = sign * (degrees + minutes / 60.0)
     return data_frame
 
 
@@ -45,35 +48,47 @@ def convert_datetime_irkutsk(_data_frame: pd.DataFrame) -> pd.DataFrame:
         - Удаленными колонками 'DATE' и 'TIME'
     """
 
-    data_frame = copy.copy(_data_frame)
-    converted_list = data_frame["DATE"].tolist()
-    for i in range(converted_list.__len__()):
-        tmp = converted_list[i].split("/")
-        date = [tmp[-1], tmp[0], tmp[1]]
-        converted_list[i] = (
-            "-".join(date) + " " + data_frame["TIME"][i] + ":00"
-        )
-        dt_datetime = datetime.strptime(converted_list[i], "%Y-%m-%d %H:%M:%S")
-        dt_datetime -= timedelta(hours=8)
-        converted_list[i] = dt_datetime.strftime("%Y-%m-%dT%H:%M:%S")
+    dt_datetime = pd.to_datetime(
+        _data_frame["DATE"] + " " + _data_frame["TIME"] + ":00",
+        format="%m/%d/%Y %H:%M:%S",
+    ) - pd.Timedelta(hours=8)
 
-    data_frame["datetime"] = converted_list
-    data_frame = data_frame.drop(columns=["DATE", "TIME"])
+    data_frame = _data_frame.drop(columns=["DATE", "TIME"])
+    data_frame["datetime"] = dt_datetime.dt.strftime("%Y-%m-%dT%H:%M:%S")
     return data_frame
 
 
 if __name__ == "__main__":
-    df_irk = convert_datetime_irkutsk(pd.read_csv("../data/raw/irk_all.csv"))
-    df_sev = pd.read_csv("../data/raw/sevastopol.csv")
+    df_irk = convert_datetime_irkutsk(
+        pd.read_csv(
+            "../data/raw/irk_all.csv",
+            usecols=["DATE", "TIME", "LATITUDE", "LONGITUDE", "CHL"],
+            dtype={
+                "DATE": "str",
+                "TIME": "str",
+                "LATITUDE": "float64",
+                "LONGITUDE": "float64",
+                "CHL": "float64",
+            },
+        )
+    )
+    df_sev = pd.read_csv(
+        "../data/raw/sevastopol.csv",
+        usecols=["datetime", "Latitude", "Longitude", "CHL"],
+        dtype={
+            "datetime": "str",
+            "Latitude": "float64",
+            "Longitude": "float64",
+            "CHL": "float64",
+        },
+    )
 
     start_idx = df_irk.index.max() + 1
-    df_sev.index = range(start_idx, start_idx + len(df_sev))
+    df_sev.index = pd.RangeIndex(start_idx, start_idx + len(df_sev))
 
-    for k in df_sev.datetime.index:
-        dt_datetime = datetime.strptime(
-            df_sev.loc[k, "datetime"], "%Y-%m-%d %H:%M:%S"
-        )
-        df_sev.loc[k, "datetime"] = dt_datetime.strftime("%Y-%m-%dT%H:%M:%S")
+    df_sev["datetime"] = pd.to_datetime(
+        df_sev["datetime"], format="%Y-%m-%d %H:%M:%S"
+    ).dt.strftime("%Y-%m-%dT%H:%M:%S")
 
     df_sev.rename(
         columns={"Latitude": "LATITUDE", "Longitude": "LONGITUDE"},